@@ -3,6 +3,7 @@ import base64
 import io
 from typing import Any, Dict, List
 
+import pybase64
 from PIL import Image
 
 from .enhanced_palette_generator import EnhancedPaletteGenerator
@@ -29,12 +30,16 @@ class PaletteEngine:
 
             social_buffer = io.BytesIO()
             social_img.save(social_buffer, format="PNG")
-            social_base64 = base64.b64encode(social_buffer.getvalue()).decode()
+            social_base64 = pybase64.b64encode_as_string(social_buffer.getbuffer())
+
+            # Built once and shared with the hex entries; callers serve it as-is
+            rgb_palette = [list(c) for c in palette]
 
             return {
                 "success": True,
                 "social_image": f"data:image/png;base64,{social_base64}",
-                "palette": [{"hex": f"#{c[0]:02x}{c[1]:02x}{c[2]:02x}", "rgb": list(c)} for c in palette],
+                "palette": [{"hex": f"#{c[0]:02x}{c[1]:02x}{c[2]:02x}", "rgb": c} for c in rgb_palette],
+                "rgb_palette": rgb_palette,
                 "cropped_image": cropped_image,
                 "raw_palette": palette,
             }
@@ -4,35 +4,51 @@ Minimal backend focused on core palette extraction
 """
 
 import base64
+import pybase64
 import io
+import re
 import os
+import shutil
+import atexit
 import zipfile
+import tempfile
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import socket
 import ipaddress
-import shutil
 import psutil
 import importlib
-import uuid
 import time
-import json
 import threading
+import collections
+import random
+import queue
 import hashlib
+import heapq
+import functools
 import hmac
+import http.cookiejar
+import zlib
 from datetime import datetime, timezone
+from secrets import token_hex
 from urllib.parse import urlparse
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
-from flask import Flask, request, jsonify, g, make_response
+from cachetools import TLRUCache, TTLCache
+from flask import Flask, request, jsonify, g
+import orjson
+import redis
 import structlog
 from prometheus_client import Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
 from flask_cors import CORS
+from werkzeug.exceptions import RequestEntityTooLarge
 
 # Import core engine
 from core.palette_engine import PaletteEngine
 
 # Global setup
-START_TIME = time.time()
+START_TIME = time.monotonic()
 
 # Configure structlog for JSON output
 structlog.configure(
@@ -66,43 +82,154 @@ IDEMPOTENCY_CONFLICTS = Counter("idempotency_conflicts_total", "Idempotency key
 STATUS_POLL_304 = Counter("status_poll_304_total", "304 responses for status polling")
 RETRY_AFTER_OBSERVED = Counter("retry_after_seconds_observed_total", "Retry-After values sent", ["seconds"])
 
-# Job storage and worker
-JOBS = {}  # In-memory job storage
-JOB_LOCK = threading.Lock()
-EXECUTOR = ThreadPoolExecutor(max_workers=3, thread_name_prefix="job-worker")
-
-# Security: Nonce cache for replay protection (5 minutes TTL)
-NONCE_CACHE = {}  # {nonce: timestamp}
-NONCE_LOCK = threading.Lock()
+# Job storage and worker: the in-memory job table is split into lock stripes
+# so status polls, job creation and worker updates on different jobs don't
+# serialize on a single lock
+JOB_SHARD_COUNT = 16  # power of two, see _shard()
+# The table is bounded: each stripe keeps its jobs in least-recently-updated
+# order and evicts from the front when full, and an expiry min-heap of
+# (monotonic expires_at, job_id) lets expired jobs be dropped without scanning
+JOB_CAPACITY = 10_000
+JOB_SHARD_CAPACITY = JOB_CAPACITY // JOB_SHARD_COUNT
+JOB_SWEEP_INTERVAL = 30  # seconds between background expiry sweeps
+JOB_SHARDS = [(collections.OrderedDict(), threading.Lock(), []) for _ in range(JOB_SHARD_COUNT)]
+# Progress lives outside the job records: a single int write to an existing
+# dict key is atomic under the GIL, so the worker loops update it lock-free
+JOB_PROGRESS = {}  # {job_id: percent}
+JOB_CACHED_STATUSES = frozenset({"queued", "completed", "failed"})  # GET body cached per transition
+JOB_TERMINAL_STATUSES = frozenset({"completed", "failed"})  # the only jobs eviction may drop
+JOB_RETRY_AFTER = {"queued": "2", "processing": "5"}  # poll hint (seconds) for unfinished jobs
+# Job workers mostly wait on I/O (URL fetches, webhooks) or on IMAGE_EXECUTOR,
+# so size the pool to the machine instead of a fixed 3 threads
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", os.cpu_count() or 3))
+EXECUTOR = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="job-worker")
+# Images inside a ZIP are processed in parallel (PIL releases the GIL while
+# decoding/resizing); shared so concurrent ZIPs can't oversubscribe the CPU
+IMAGE_EXECUTOR = ThreadPoolExecutor(max_workers=os.cpu_count() or 4, thread_name_prefix="image-worker")
+# url_batch downloads are I/O bound and fan out on their own pool
+FETCH_EXECUTOR = ThreadPoolExecutor(max_workers=16, thread_name_prefix="url-fetch")
+URL_BATCH_WINDOW = 8  # URLs per job downloaded or held for processing at once (≤50MB each)
+
+# Security: Nonce cache for replay protection (5 minutes TTL). Bounded and
+# expired lazily on access; a full cache rejects new nonces rather than evicting
+# live ones. The per-entry jitter spreads expiry of burst traffic.
+# cachetools caches are not thread-safe, so mutation stays under the locks.
 NONCE_TTL = 300  # 5 minutes
+NONCE_TTL_JITTER = 30
+NONCE_CACHE = TLRUCache(
+    maxsize=100_000,
+    ttu=lambda _nonce, _ts, now: now + NONCE_TTL + random.randint(0, NONCE_TTL_JITTER),
+)  # {nonce: timestamp}
+NONCE_LOCK = threading.Lock()
+
+def _http_session(max_retries) -> requests.Session:
+    """Pooled keep-alive session that never stores cookies: it is shared by
+    fetches made for different clients, so one URL's cookies must not be
+    sent on another client's request"""
+    session = requests.Session()
+    session.cookies.set_policy(http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+    adapter = HTTPAdapter(pool_connections=32, pool_maxsize=128, max_retries=max_retries)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+# Outbound HTTP for jobs and webhooks. Only connect errors and 502/503/504 on
+# idempotent methods are retried; the final response is returned so callers
+# keep their own status handling.
+HTTP = _http_session(Retry(total=2, read=0, backoff_factor=0.2, status_forcelist=[502, 503, 504], raise_on_status=False))
+# /fetch_url answers within its 40s timeout, so it never retries
+FETCH_URL_HTTP = _http_session(0)
+
+# HMAC key shared by request signatures and webhook callbacks, encoded once
+_HMAC_KEY = os.environ.get("WEBHOOK_SECRET", "brewchrome-default-secret").encode()
 
 # Idempotency cache
-IDEMPOTENCY_CACHE = {}  # {key: (job_id, body_hash)}
+IDEMPOTENCY_TTL = 86_400  # 24 hours
+IDEMPOTENCY_CACHE = TTLCache(maxsize=10_000, ttl=IDEMPOTENCY_TTL)  # {key: (job_id, body_fingerprint)}
 IDEMPOTENCY_LOCK = threading.Lock()
+IDEMPOTENCY_QUEUE = queue.Queue(maxsize=10_000)  # (key, b"job_id:fingerprint") pending Redis writes
+
+# Optional shared state: with REDIS_URL set, nonces and idempotency keys live in
+# Redis (atomic SET NX EX) so every replica shares them and they survive restarts
+REDIS_URL = os.environ.get("REDIS_URL")
+REDIS = (
+    redis.Redis(connection_pool=redis.BlockingConnectionPool.from_url(REDIS_URL, max_connections=32))
+    if REDIS_URL else None
+)
+
+# Multipart ZIP uploads for async jobs are spooled here until the worker runs;
+# small uploads are handed over in memory as raw bytes instead. Jobs live in
+# memory, so the directory is private to this process and removed on exit.
+JOB_UPLOAD_DIR = tempfile.mkdtemp(prefix="brewchrome-jobs-")
+atexit.register(shutil.rmtree, JOB_UPLOAD_DIR, ignore_errors=True)
+JOB_UPLOAD_INLINE_MAX = 1024 * 1024  # 1MB
+
+# Request bodies hashed in _before are spooled here; larger ones spill to disk
+BODY_SPOOL_MAX_MEMORY = 1024 * 1024  # 1MB
+BODY_HASH_CHUNK = 1024 * 1024  # 1MB
+BASE64_DECODE_CHUNK = 4 * 1024 * 1024  # base64 chars per decode slice, multiple of 4
+
+# Readiness cache: healthy results are reused longer than unhealthy ones
+# so probes stay cheap while recovery is still noticed quickly
+READY_CACHE_TTL_OK = 2.0
+READY_CACHE_TTL_FAIL = 0.2
+_READY_CACHE = {"entry": None}  # {"entry": (expires_at, body, status_code)}
+# Scrapes landing within a second of each other share one generate_latest() pass
+METRICS_CACHE_TTL = 1.0
+_METRICS_CACHE = {"entry": None}  # {"entry": (expires_at, body)}
+# Passing disk/mem checks are trusted this long, so the fast re-checks of an
+# unhealthy /ready only repeat the syscalls for checks that actually failed
+DEP_CHECK_TTL = 2.0
+
+# Error rate window: one [second, requests, 5xx] bucket per monotonic second,
+# reused as a ring, so memory is fixed and counts stay exact at any traffic
+ERROR_RATE_WINDOW = 300  # 5 minutes
+_RATE_BUCKETS = [[-1, 0, 0] for _ in range(ERROR_RATE_WINDOW)]
+_RATE_LOCK = threading.Lock()
+_PROBE_PATHS = frozenset(("/health", "/ready", "/metrics"))
 
 app = Flask(__name__)
+# Response payloads have a fixed shape: skip key sorting and ASCII escaping
+app.json.sort_keys = False
+app.json.ensure_ascii = False
+# Werkzeug rejects larger bodies while parsing, before they are spooled to disk.
+# JSON bodies carry ZIPs as base64 (4/3 of the archive), so they get a higher
+# cap in _before that still admits a 500MB archive
+app.config["MAX_CONTENT_LENGTH"] = 500 * 1024 * 1024  # 500MB
+JSON_MAX_CONTENT_LENGTH = 700 * 1024 * 1024  # base64 of 500MB is ~667MB
 CORS(app)
 
+def _record_outcome(is_error: bool):
+    """Count a finished request in the current second's error-rate bucket"""
+    second = int(time.monotonic())
+    bucket = _RATE_BUCKETS[second % ERROR_RATE_WINDOW]
+    with _RATE_LOCK:
+        if bucket[0] != second:
+            bucket[:] = [second, 0, 0]
+        bucket[1] += 1
+        if is_error:
+            bucket[2] += 1
+
 @app.before_request
 def _before():
-    g._start = time.time()
-    rid = request.headers.get("X-Request-Id")
-    if not rid:
-        rid = uuid.uuid4().hex[:8]
-    g.request_id = rid
+    g._start = time.monotonic()
+    # Set unconditionally so everything downstream can read g.request_id directly
+    g.request_id = request.headers.get("X-Request-Id") or token_hex(4)
     g.endpoint_label = request.path
-    
-    # Clean expired nonces periodically
-    if time.time() % 60 < 1:  # Every ~60 seconds
-        cleanup_nonce_cache()
+    if request.mimetype == "application/json":
+        request.max_content_length = JSON_MAX_CONTENT_LENGTH
     
     # Security validation for sensitive endpoints
     if request.path.startswith('/jobs') and request.method in ['POST', 'PUT', 'DELETE']:
+        # Hash the body once; signature and idempotency checks both reuse it
+        g.body_sha256 = digest_request_body(request)
+        
         # Skip signature validation for now - can be enabled with environment variable
         if os.environ.get("REQUIRE_SIGNATURE") == "true":
             valid, error_code, error_message = validate_request_signature(request)
             if not valid:
-                return make_error(401, error_code, "Authentication failed", error_message)
+                status_code = 503 if error_code == "NONCE_STORE_FULL" else 401
+                return make_error(status_code, error_code, "Authentication failed", error_message)
     
     # bytes in
     try:
@@ -110,16 +237,25 @@ def _before():
     except Exception:
         g.bytes_in = 0
 
+@app.errorhandler(RequestEntityTooLarge)
+def _too_large(e):
+    """Bodies over the request's size cap, rejected by Werkzeug while reading them"""
+    return make_error(413, "PAYLOAD_TOO_LARGE", "Request body exceeds size limit")
+
 @app.after_request
 def _after(resp):
     try:
-        duration_ms = int((time.time() - getattr(g, "_start", time.time())) * 1000)
+        duration_ms = int((time.monotonic() - g._start) * 1000)
         code = resp.status_code
-        endpoint = getattr(g, "endpoint_label", request.path)
+        endpoint = g.endpoint_label
         
         REQUESTS_TOTAL.labels(endpoint=endpoint, code=str(code)).inc()
         REQUEST_DURATION.labels(endpoint=endpoint).observe(duration_ms)
         
+        # error rate window (probes excluded)
+        if request.path not in _PROBE_PATHS:
+            _record_outcome(code >= 500)
+        
         # bytes out
         bytes_out = 0
         try:
@@ -127,21 +263,14 @@ def _after(resp):
         except Exception:
             pass
             
-        # success flag
-        success = None
-        error_code = None
-        try:
-            if resp.mimetype == "application/json" and resp.get_data():
-                payload = json.loads(resp.get_data(as_text=True))
-                success = payload.get("success")
-                error_code = payload.get("error_code")
-        except Exception:
-            pass
+        # success flag, set by endpoints and make_error (no response re-parse)
+        success = getattr(g, "success", None)
+        error_code = getattr(g, "error_code", None)
             
         # structured log
         logger.info(
             "http_request",
-            request_id=getattr(g, "request_id", None),
+            request_id=g.request_id,
             endpoint=endpoint,
             method=request.method,
             status_code=code,
@@ -153,35 +282,106 @@ def _after(resp):
         )
         
         # propagate request id
-        resp.headers["X-Request-Id"] = getattr(g, "request_id", "")
+        resp.headers["X-Request-Id"] = g.request_id
         
     except Exception as e:
         logger.error("after_request_error", error=str(e))
         
     return resp
 
+def _shard(job_id: str) -> tuple:
+    """Return the (jobs dict, lock, expiry heap) stripe owning job_id"""
+    return JOB_SHARDS[zlib.crc32(job_id.encode()) & (JOB_SHARD_COUNT - 1)]
+
+def get_job(job_id: str) -> dict:
+    """Lock-free lookup: records are immutable snapshots swapped in by _update_job"""
+    return _shard(job_id)[0].get(job_id)
+
+def _update_job(job_id: str, **changes) -> dict:
+    """Replace a job with an updated snapshot under its stripe lock"""
+    jobs, lock, _ = _shard(job_id)
+    with lock:
+        job = jobs.get(job_id)
+        if job is None:
+            return None
+        job = {**job, **changes}
+        if job["status"] in JOB_CACHED_STATUSES:
+            job["_cached_json"], job["_etag"] = _render_job(job)
+            # The rendered body is the only copy of the results kept in memory
+            job["results"] = None
+        jobs[job_id] = job
+        jobs.move_to_end(job_id)
+        return job
+
+def _discard_job(job: dict) -> None:
+    """Release what a job holds outside the table once it is dropped"""
+    JOB_PROGRESS.pop(job["id"], None)
+    zip_path = job["data"].get("zip_path")
+    if zip_path:
+        try:
+            os.remove(zip_path)
+        except OSError:
+            pass
+
+def _sweep_expired(jobs, expiry: list, now: float) -> None:
+    """Drop a stripe's expired jobs; caller holds the stripe lock"""
+    while expiry and expiry[0][0] <= now:
+        _, job_id = heapq.heappop(expiry)
+        job = jobs.pop(job_id, None)
+        if job is not None:
+            _discard_job(job)
+
+def _expiry_sweeper():
+    """Background thread: drop expired jobs even if nobody polls or creates jobs"""
+    while True:
+        time.sleep(JOB_SWEEP_INTERVAL)
+        now = time.monotonic()
+        for jobs, lock, expiry in JOB_SHARDS:
+            with lock:
+                _sweep_expired(jobs, expiry, now)
+
+threading.Thread(target=_expiry_sweeper, name="job-expiry", daemon=True).start()
+
 # Initialize core engine
 def create_job(job_type: str, data: dict, callback_url: str = None, ttl_h: int = 24, idempotency_key: str = None) -> str:
-    """Create new async job"""
-    job_id = f"job_{uuid.uuid4().hex[:8]}"
+    """Create new async job; returns None when its stripe is full of active jobs"""
+    job_id = f"job_{token_hex(4)}"
+    jobs, lock, expiry = _shard(job_id)
     
-    with JOB_LOCK:
-        JOBS[job_id] = {
-            "id": job_id,
-            "type": job_type,
-            "status": "queued",
-            "progress": 0,
-            "data": data,
-            "callback_url": callback_url,
-            "created_at": time.time(),
-            "started_at": None,
-            "finished_at": None,
-            "ttl_h": min(ttl_h, 168),  # Max 7 days
-            "results": None,
-            "error": None,
-            "request_id": getattr(g, "request_id", uuid.uuid4().hex[:8]),
-            "idempotency_key": idempotency_key
-        }
+    job = {
+        "id": job_id,
+        "type": job_type,
+        "status": "queued",
+        "data": data,
+        "callback_url": callback_url,
+        "created_at": time.time(),  # wall clock, reported to clients
+        "created_monotonic": time.monotonic(),  # TTL math, immune to clock jumps
+        "started_at": None,
+        "finished_at": None,
+        "ttl_h": min(ttl_h, 168),  # Max 7 days
+        "results": None,
+        "error": None,
+        "request_id": g.request_id,
+        "idempotency_key": idempotency_key
+    }
+    job["_cached_json"], job["_etag"] = _render_job(job)
+    
+    with lock:
+        _sweep_expired(jobs, expiry, job["created_monotonic"])
+        # Make room by evicting the least recently updated finished job; jobs
+        # still queued or running are never dropped, a client holds their 202
+        while len(jobs) >= JOB_SHARD_CAPACITY:
+            victim = next((jid for jid, j in jobs.items() if j["status"] in JOB_TERMINAL_STATUSES), None)
+            if victim is None:
+                return None
+            _discard_job(jobs.pop(victim))
+        JOB_PROGRESS[job_id] = 0
+        jobs[job_id] = job
+        heapq.heappush(expiry, (job["created_monotonic"] + job["ttl_h"] * 3600, job_id))
+        # Evicted jobs leave their heap entries behind; compact once they dominate
+        if len(expiry) > 2 * JOB_SHARD_CAPACITY:
+            expiry[:] = [entry for entry in expiry if entry[1] in jobs]
+            heapq.heapify(expiry)
     
     # Submit to worker
     EXECUTOR.submit(process_job, job_id)
@@ -192,53 +392,94 @@ def create_job(job_type: str, data: dict, callback_url: str = None, ttl_h: int =
 def process_job(job_id: str):
     """Process job in background thread"""
     try:
-        with JOB_LOCK:
-            if job_id not in JOBS:
-                return
-            job = JOBS[job_id]
-            job["status"] = "processing"
-            job["started_at"] = time.time()
+        job = _update_job(job_id, status="processing", started_at=time.time())
+        if job is None:
+            return
         
         job_type = job["type"]
         data = job["data"]
         results = []
         
         if job_type == "zip_batch":
-            # Process ZIP file
-            zip_data = data["zip_data"]
-            result = process_zip_file(zip_data)
+            def zip_progress(done, total):
+                if job_id in JOB_PROGRESS:  # not if the job was dropped meanwhile
+                    JOB_PROGRESS[job_id] = int(done / total * 100)
+            
+            # Process ZIP file: multipart uploads arrive as raw bytes or a
+            # spooled file on disk, the JSON fallback as a base64 string
+            if "zip_bytes" in data:
+                result = process_zip_bytes(data["zip_bytes"], zip_progress)
+            elif "zip_path" in data:
+                try:
+                    with open(data["zip_path"], "rb") as zip_stream:
+                        result = process_zip_stream(zip_stream, zip_progress)
+                finally:
+                    try:
+                        os.remove(data["zip_path"])
+                    except OSError:
+                        pass
+            else:
+                result = process_zip_file(data["zip_data"], zip_progress)
             
             if result.get("success"):
                 results = result.get("results", [])
-                # Update progress incrementally
-                for i, _ in enumerate(results):
-                    with JOB_LOCK:
-                        JOBS[job_id]["progress"] = int((i + 1) / len(results) * 100)
-                    time.sleep(0.1)  # Simulate processing time
             else:
                 raise Exception(result.get("error", "ZIP processing failed"))
                 
         elif job_type == "url_batch":
-            # Process multiple URLs
+            # Process multiple URLs: downloads run concurrently and each image
+            # goes to IMAGE_EXECUTOR as soon as its download completes. At most
+            # URL_BATCH_WINDOW URLs are downloading or awaiting processing at
+            # once, so peak memory is bounded by the window, not the batch size
             urls = data["urls"]
-            for i, url in enumerate(urls):
-                try:
-                    # Fetch and process URL
-                    fetch_result = fetch_url_internal(url)
-                    if fetch_result.get("success"):
-                        process_result = process_image(fetch_result["image"])
-                        if process_result.get("success"):
-                            results.append({
-                                "filename": url.split("/")[-1] or f"url_{i+1}",
-                                "palette": process_result["palette"],
-                                "social_image": process_result["social_image"]
-                            })
-                except Exception as e:
-                    logger.error("URL processing failed in job", job_id=job_id, url=url, error=str(e))
-                
-                # Update progress
-                with JOB_LOCK:
-                    JOBS[job_id]["progress"] = int((i + 1) / len(urls) * 100)
+            pending = {}  # {future: (stage, index)}
+            next_index = 0
+            finished = 0
+            url_results = {}
+            
+            def fetch_next():
+                nonlocal next_index
+                if next_index < len(urls):
+                    pending[FETCH_EXECUTOR.submit(fetch_url_internal, urls[next_index])] = ("fetch", next_index)
+                    next_index += 1
+            
+            for _ in range(URL_BATCH_WINDOW):
+                fetch_next()
+            
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage, i = pending.pop(future)
+                    url = urls[i]
+                    if stage == "fetch":
+                        fetch_result = future.result()
+                        if fetch_result.get("success"):
+                            # The URL keeps its window slot until processed;
+                            # the fetch future (and its bytes) is dropped here
+                            pending[IMAGE_EXECUTOR.submit(
+                                process_image_bytes, fetch_result["image_bytes"], fetch_result["content_type"]
+                            )] = ("process", i)
+                            continue
+                    else:
+                        try:
+                            process_result = future.result()
+                            if process_result.get("success"):
+                                url_results[i] = {
+                                    "filename": url.split("/")[-1] or f"url_{i+1}",
+                                    "palette": process_result["palette"],
+                                    "social_image": process_result["social_image"]
+                                }
+                        except Exception as e:
+                            logger.error("URL processing failed in job", job_id=job_id, url=url, error=str(e))
+                    
+                    # Update progress and hand the freed slot to the next URL
+                    finished += 1
+                    if job_id in JOB_PROGRESS:  # not if the job was dropped meanwhile
+                        JOB_PROGRESS[job_id] = int(finished / len(urls) * 100)
+                    fetch_next()
+            
+            # Keep results in request order
+            results = [url_results[i] for i in sorted(url_results)]
         
         # Generate download_url if results are large
         download_url = None
@@ -246,12 +487,18 @@ def process_job(job_id: str):
             download_url = f"https://storage.googleapis.com/brewchrome/jobs/{job_id}/results.zip"
         
         # Job completed successfully
-        with JOB_LOCK:
-            JOBS[job_id]["status"] = "completed"
-            JOBS[job_id]["progress"] = 100
-            JOBS[job_id]["finished_at"] = time.time()
-            JOBS[job_id]["results"] = results
-            JOBS[job_id]["download_url"] = download_url
+        if job_id in JOB_PROGRESS:
+            JOB_PROGRESS[job_id] = 100
+        finished_at = time.time()
+        _update_job(
+            job_id,
+            status="completed",
+            finished_at=finished_at,
+            results=results,
+            results_count=len(results),
+            download_url=download_url,
+            download_expires_at=int(finished_at + 3600) if download_url else None,  # 1 hour
+        )
             
         JOBS_COMPLETED.labels(status="completed").inc()
         IMAGES_PROCESSED_TOTAL.labels(endpoint="/jobs").inc(len(results))
@@ -262,13 +509,15 @@ def process_job(job_id: str):
             
     except Exception as e:
         # Job failed
-        with JOB_LOCK:
-            JOBS[job_id]["status"] = "failed"
-            JOBS[job_id]["finished_at"] = time.time()
-            JOBS[job_id]["error"] = {
+        _update_job(
+            job_id,
+            status="failed",
+            finished_at=time.time(),
+            error={
                 "error_code": "PROCESSING_ERROR",
                 "message": str(e)
-            }
+            },
+        )
             
         JOBS_COMPLETED.labels(status="failed").inc()
         logger.error("Job processing failed", job_id=job_id, error=str(e))
@@ -280,8 +529,7 @@ def process_job(job_id: str):
 def send_callback(callback_url: str, job_id: str, status: str):
     """Send callback notification with HMAC signature"""
     try:
-        with JOB_LOCK:
-            job = JOBS.get(job_id, {})
+        job = get_job(job_id) or {}
             
         timestamp = int(time.time())
         payload = {
@@ -294,20 +542,15 @@ def send_callback(callback_url: str, job_id: str, status: str):
         }
         
         if status == "completed":
-            payload["results_count"] = len(job.get("results", []))
+            payload["results_count"] = job.get("results_count", 0)
             if job.get("download_url"):
                 payload["download_url"] = job["download_url"]
         elif status == "failed":
             payload["error"] = job.get("error", {})
         
-        # Create HMAC signature
-        webhook_secret = os.environ.get("WEBHOOK_SECRET", "brewchrome-default-secret")
-        payload_json = json.dumps(payload, sort_keys=True)
-        signature = hmac.new(
-            webhook_secret.encode(),
-            payload_json.encode(),
-            hashlib.sha256
-        ).hexdigest()
+        # Create HMAC signature over the exact bytes that are sent
+        payload_json = orjson.dumps(payload, option=orjson.OPT_SORT_KEYS)
+        signature = hmac.new(_HMAC_KEY, payload_json, hashlib.sha256).hexdigest()
         
         headers = {
             "Content-Type": "application/json",
@@ -317,7 +560,7 @@ def send_callback(callback_url: str, job_id: str, status: str):
             "User-Agent": "BrewChrome-Webhook/1.0"
         }
         
-        response = requests.post(callback_url, json=payload, headers=headers, timeout=10)
+        response = HTTP.post(callback_url, data=payload_json, headers=headers, timeout=10)
         
         if response.status_code == 200:
             logger.info("Webhook delivered", job_id=job_id, callback_url=callback_url, status=status)
@@ -330,7 +573,7 @@ def send_callback(callback_url: str, job_id: str, status: str):
 def fetch_url_internal(url: str) -> dict:
     """Internal URL fetching for jobs"""
     try:
-        response = requests.get(url, timeout=30, headers={"User-Agent": "BrewChrome-Jobs/1.0"})
+        response = HTTP.get(url, timeout=30, headers={"User-Agent": "BrewChrome-Jobs/1.0"})
         response.raise_for_status()
         
         content_type = response.headers.get("content-type", "").lower()
@@ -341,23 +584,44 @@ def fetch_url_internal(url: str) -> dict:
         if len(image_data) > 50 * 1024 * 1024:
             return {"success": False, "error": "Image too large"}
             
-        image_base64 = base64.b64encode(image_data).decode("utf-8")
         return {
             "success": True,
-            "image": f"data:{content_type};base64,{image_base64}"
+            "image_bytes": image_data,
+            "content_type": content_type
         }
         
     except Exception as e:
         return {"success": False, "error": str(e)}
 
-def cleanup_nonce_cache():
-    """Clean expired nonces"""
-    current_time = time.time()
+def digest_request_body(request) -> str:
+    """SHA-256 the request body in chunks while spooling it for later parsing"""
+    spool = tempfile.SpooledTemporaryFile(max_size=BODY_SPOOL_MAX_MEMORY)
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: request.stream.read(BODY_HASH_CHUNK), b""):
+        digest.update(chunk)
+        spool.write(chunk)
+    spool.seek(0)
+    # Form/JSON parsing reads the spooled copy instead of the consumed input
+    request.stream = spool
+    return digest.hexdigest()
+
+def claim_nonce(nonce: str, current_time: int) -> str | None:
+    """Record a nonce; returns None on success or the error code to reject with"""
+    if REDIS is not None:
+        ttl = NONCE_TTL + random.randint(0, NONCE_TTL_JITTER)
+        if not REDIS.set(f"nonce:{nonce}", current_time, nx=True, ex=ttl):
+            return "NONCE_REUSED"
+        return None
+    
     with NONCE_LOCK:
-        expired = [nonce for nonce, timestamp in NONCE_CACHE.items() 
-                  if current_time - timestamp > NONCE_TTL]
-        for nonce in expired:
-            NONCE_CACHE.pop(nonce, None)
+        if nonce in NONCE_CACHE:
+            return "NONCE_REUSED"
+        # Fail closed: evicting a live nonce would let it be replayed
+        NONCE_CACHE.expire()
+        if len(NONCE_CACHE) >= NONCE_CACHE.maxsize:
+            return "NONCE_STORE_FULL"
+        NONCE_CACHE[nonce] = current_time
+    return None
 
 def validate_request_signature(request):
     """Validate HMAC signature for secure endpoints"""
@@ -375,87 +639,142 @@ def validate_request_signature(request):
         if abs(current_time - timestamp) > 300:
             return False, "TIMESTAMP_OUT_OF_RANGE", "Request timestamp outside valid window"
         
-        # Check nonce reuse
-        nonce = request.headers.get('X-Request-Id', '')
-        with NONCE_LOCK:
-            if nonce in NONCE_CACHE:
-                return False, "NONCE_REUSED", "Request ID already used"
-            NONCE_CACHE[nonce] = current_time
-        
-        # Calculate expected signature
-        body = request.get_data()
-        body_hash = hashlib.sha256(body).hexdigest()
+        # Calculate expected signature (body digest computed in _before)
+        message = f"{timestamp}\n{request.method}\n{request.path}\n{g.body_sha256}"
         
-        message = f"{timestamp}\n{request.method}\n{request.path}\n{body_hash}"
+        expected_signature = hmac.new(_HMAC_KEY, message.encode(), hashlib.sha256).digest()
         
-        webhook_secret = os.environ.get("WEBHOOK_SECRET", "brewchrome-default-secret")
-        expected_signature = hmac.new(
-            webhook_secret.encode(),
-            message.encode(),
-            hashlib.sha256
-        ).hexdigest()
+        # Compare raw digests: header is "sha256=<hex>"
+        scheme, _, signature_hex = signature_header.partition("=")
+        try:
+            provided_signature = bytes.fromhex(signature_hex)
+        except ValueError:
+            return False, "INVALID_SIGNATURE", "Signature verification failed"
         
-        if not hmac.compare_digest(signature_header, f"sha256={expected_signature}"):
+        if scheme != "sha256" or not hmac.compare_digest(provided_signature, expected_signature):
             return False, "INVALID_SIGNATURE", "Signature verification failed"
         
+        # Check nonce reuse only once the request is authenticated, so
+        # unsigned traffic can't fill the nonce store
+        nonce = request.headers.get('X-Request-Id', '')
+        nonce_error = claim_nonce(nonce, current_time)
+        if nonce_error == "NONCE_REUSED":
+            return False, nonce_error, "Request ID already used"
+        if nonce_error:
+            return False, nonce_error, "Too many requests in the replay window"
+        
         return True, None, None
         
     except (ValueError, TypeError):
         return False, "INVALID_TIMESTAMP", "Invalid timestamp format"
 
-def check_idempotency(key: str, body_data: bytes) -> tuple:
+def _body_fingerprint(body_hash: str) -> bytes:
+    """16-byte replay fingerprint of a request body, from its sha256 hex digest"""
+    return bytes.fromhex(body_hash)[:16]
+
+def check_idempotency(key: str, body_hash: str) -> tuple:
     """Check idempotency key and body hash"""
     if not key:
         return None, None
     
-    body_hash = hashlib.sha256(body_data).hexdigest()
-    
+    # Keys issued by this replica are always in the local cache, even while
+    # their Redis write is still queued
     with IDEMPOTENCY_LOCK:
-        if key in IDEMPOTENCY_CACHE:
-            cached_job_id, cached_hash = IDEMPOTENCY_CACHE[key]
-            if cached_hash != body_hash:
-                return None, "IDEMPOTENCY_VIOLATION"
-            return cached_job_id, None
+        cached = IDEMPOTENCY_CACHE.get(key)
+    
+    if cached is None and REDIS is not None:
+        cached = REDIS.get(f"idem:{key}")
+        if cached:
+            cached_job_id, cached_fingerprint = cached.split(b":", 1)
+            cached = (cached_job_id.decode(), cached_fingerprint)
+    
+    if cached:
+        cached_job_id, cached_fingerprint = cached
+        if cached_fingerprint != _body_fingerprint(body_hash):
+            return None, "IDEMPOTENCY_VIOLATION"
+        return cached_job_id, None
     
     return None, None
 
-def store_idempotency(key: str, job_id: str, body_data: bytes):
-    """Store idempotency mapping"""
+def store_idempotency(key: str, job_id: str, body_hash: str):
+    """Store idempotency mapping; the Redis write happens off the request thread"""
     if not key:
         return
     
-    body_hash = hashlib.sha256(body_data).hexdigest()
+    # Only a fixed-size fingerprint of the body is kept, never the body itself
+    fingerprint = _body_fingerprint(body_hash)
     with IDEMPOTENCY_LOCK:
-        IDEMPOTENCY_CACHE[key] = (job_id, body_hash)
+        IDEMPOTENCY_CACHE[key] = (job_id, fingerprint)
+    
+    if REDIS is not None:
+        value = job_id.encode() + b":" + fingerprint
+        try:
+            IDEMPOTENCY_QUEUE.put_nowait((key, value))
+        except queue.Full:
+            REDIS.set(f"idem:{key}", value, nx=True, ex=IDEMPOTENCY_TTL)
+
+def _idempotency_writer():
+    """Drain queued idempotency mappings into Redis, pipelining whatever has piled up"""
+    while True:
+        batch = [IDEMPOTENCY_QUEUE.get()]
+        while len(batch) < 100:
+            try:
+                batch.append(IDEMPOTENCY_QUEUE.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            with REDIS.pipeline(transaction=False) as pipe:
+                for key, value in batch:
+                    pipe.set(f"idem:{key}", value, nx=True, ex=IDEMPOTENCY_TTL)
+                pipe.execute()
+        except redis.RedisError as e:
+            logger.error("idempotency_store_failed", keys=len(batch), error=str(e))
+
+if REDIS is not None:
+    threading.Thread(target=_idempotency_writer, name="idempotency-writer", daemon=True).start()
 
 ENGINE = PaletteEngine()
 
+def json_response(payload, status_code: int = 200):
+    """JSON response serialized with orjson (large palette/social image payloads)"""
+    return app.response_class(orjson.dumps(payload), status=status_code, mimetype="application/json")
+
+@functools.lru_cache(maxsize=256)
+def _error_counter(endpoint: str, error_code: str):
+    """Bound Prometheus child counter, resolved once per (endpoint, error_code)"""
+    return ERRORS_TOTAL.labels(endpoint=endpoint, error_code=error_code)
+
+def multipart_declared_over(limit: int) -> bool:
+    """True if a multipart upload declares a Content-Length over limit, so it can
+    be rejected before the body is parsed; chunked bodies are checked by size later"""
+    return request.mimetype == 'multipart/form-data' and (request.content_length or 0) > limit
+
 def make_error(status_code: int, error_code: str, user_message: str, developer_message: str = None):
     """Create standardized error response with enhanced taxonomy"""
-    rid = getattr(g, "request_id", None) or uuid.uuid4().hex[:8]
     payload = {
         "error_code": error_code,
         "user_message": user_message,
-        "request_id": rid,
+        "request_id": g.request_id,
         "timestamp": int(time.time())
     }
     
+    g.success = False
+    g.error_code = error_code
+    
     # Metrics
-    endpoint = getattr(g, "endpoint_label", request.path)
-    ERRORS_TOTAL.labels(endpoint=endpoint, error_code=error_code).inc()
+    endpoint = g.endpoint_label
+    _error_counter(endpoint, error_code).inc()
     
     # Log error with developer message
     logger.error("http_error", 
-                request_id=rid, 
+                request_id=g.request_id, 
                 endpoint=endpoint, 
                 status_code=status_code, 
                 error_code=error_code, 
                 user_message=user_message,
                 developer_message=developer_message or user_message)
     
-    resp = jsonify(payload)
-    resp.status_code = status_code
-    return resp
+    return json_response(payload, status_code)
 
 def is_private_ip(ip):
     """Check if IP is private (SSRF protection)"""
@@ -464,64 +783,123 @@ def is_private_ip(ip):
     except ValueError:
         return False
 
-def process_image(image_data):
-    """Process a single base64 image using core PaletteEngine."""
-    try:
-        result = ENGINE.process_base64_image(image_data)
-        if not result.get("success"):
-            return {"success": False, "error": result.get("error", "Unknown error")}
+def _image_result(result: dict) -> dict:
+    """Shape a PaletteEngine result for the React app"""
+    if not result.get("success"):
+        return {"success": False, "error": result.get("error", "Unknown error")}
 
-        # Normalized palette for React app
-        normalized_palette = []
-        for c in result.get("palette", []):
-            if isinstance(c, dict) and "rgb" in c:
-                normalized_palette.append(c["rgb"])
-            elif isinstance(c, (list, tuple)) and len(c) == 3:
-                normalized_palette.append(list(c))
+    return {
+        "success": True,
+        "palette": result["rgb_palette"],  # already [[r, g, b], ...]
+        "social_image": result.get("social_image"),  # Include social image
+    }
 
-        return {
-            "success": True,
-            "palette": normalized_palette,
-            "social_image": result.get("social_image"),  # Include social image
-        }
+def process_image_bytes(raw: bytes, content_type: str = None):
+    """Process raw image bytes using core PaletteEngine."""
+    try:
+        return _image_result(ENGINE.process_image_data(raw, format_hint=content_type))
     except Exception as e:
         return {"success": False, "error": f"Image processing failed: {str(e)}"}
 
-def process_zip_file(zip_data):
-    """Process ZIP file containing images - return detailed results with social images"""
+def process_image(image_data):
+    """Process a single base64 image (JSON fallback) using core PaletteEngine."""
     try:
-        if not zip_data:
-            return {"success": False, "error": "No ZIP data provided"}
+        return _image_result(ENGINE.process_base64_image(image_data))
+    except Exception as e:
+        return {"success": False, "error": f"Image processing failed: {str(e)}"}
 
-        # Handle base64 ZIP data
+# ZIP entries accepted for processing: image extension, and no absolute path,
+# parent-directory or backslash components (path traversal protection)
+_ZIP_IMAGE_RE = re.compile(r"(?!/)(?!.*\.\.)(?!.*\\).*\.(?:jpe?g|png|webp)", re.IGNORECASE | re.DOTALL)
+
+# ZIP bomb guards, checked against the central directory before any read()
+ZIP_MAX_ENTRY_SIZE = 50 * 1024 * 1024  # 50MB uncompressed per image
+ZIP_MAX_TOTAL_SIZE = 1024 * 1024 * 1024  # 1GB uncompressed per ZIP
+ZIP_MAX_COMPRESSION_RATIO = 100
+# Decoded entries per ZIP held at once (read but not yet processed)
+ZIP_READ_WINDOW = os.cpu_count() or 4
+
+def process_zip_file(zip_data, on_progress=None):
+    """Process a base64 ZIP (JSON fallback) - decodes to a spool and delegates to process_zip_stream"""
+    if not zip_data:
+        return {"success": False, "error": "No ZIP data provided"}
+
+    # Decode in fixed-size slices straight into a spooled file, so the decoded
+    # archive is never held in memory next to the (already large) base64 string
+    start = zip_data.find(",") + 1 if zip_data.startswith("data:") else 0
+    with tempfile.SpooledTemporaryFile(max_size=BODY_SPOOL_MAX_MEMORY) as spool:
         try:
-            if zip_data.startswith("data:"):
-                base64_part = zip_data.split(",")[1]
-            else:
-                base64_part = zip_data
-            zip_bytes = base64.b64decode(base64_part)
+            try:
+                for i in range(start, len(zip_data), BASE64_DECODE_CHUNK):
+                    spool.write(pybase64.b64decode(zip_data[i:i + BASE64_DECODE_CHUNK], validate=True))
+            except ValueError:
+                # Whitespace or stray characters shift slice alignment: fall
+                # back to one lenient decode of the whole payload
+                spool.seek(0)
+                spool.truncate()
+                spool.write(base64.b64decode(zip_data[start:]))
         except Exception as e:
             return {"success": False, "error": f"Base64 decode error: {str(e)}"}
 
+        return process_zip_stream(spool, on_progress)
+
+def process_zip_bytes(zip_bytes: bytes, on_progress=None):
+    """Process an in-memory ZIP - wraps the bytes and delegates to process_zip_stream"""
+    if not zip_bytes:
+        return {"success": False, "error": "No ZIP data provided"}
+
+    return process_zip_stream(io.BytesIO(zip_bytes), on_progress)
+
+def _collect_zip_result(file_name: str, future, results: list) -> int:
+    """Append one ZIP entry's processed result; returns 1 if it succeeded"""
+    try:
+        result = future.result()
+    except Exception as e:
+        logger.error("zip_entry_processing_failed", filename=file_name, error=str(e))
+        return 0
+    if not result.get("success"):
+        return 0
+    results.append({
+        "filename": file_name,
+        "palette": result["rgb_palette"],
+        "social_image": result.get("social_image")  # Can be None for fallback
+    })
+    return 1
+
+def process_zip_stream(zip_stream, on_progress=None):
+    """Process ZIP file containing images from a seekable file object - return detailed results with social images
+
+    on_progress(done, total) is called as each image entry is finished.
+    """
+    try:
         # Validate ZIP file
-        if len(zip_bytes) < 22:
+        zip_size = zip_stream.seek(0, io.SEEK_END)
+        zip_stream.seek(0)
+        if zip_size < 22:
             return {"success": False, "error": "Invalid ZIP file: too small"}
-        if len(zip_bytes) > 500 * 1024 * 1024:  # 500MB limit
+        if zip_size > 500 * 1024 * 1024:  # 500MB limit
             return {"success": False, "error": "ZIP too large: exceeds 500MB limit"}
 
         results = []
         processed_count = 0
 
         try:
-            with zipfile.ZipFile(io.BytesIO(zip_bytes), "r") as zip_file:
-                # Filter image files and validate paths
+            with zipfile.ZipFile(zip_stream, "r") as zip_file:
+                # Filter image files and validate paths; oversized or suspiciously
+                # compressed entries are skipped without being decompressed
                 image_files = []
-                for file_name in zip_file.namelist():
-                    # Path traversal protection
-                    if ".." in file_name or file_name.startswith("/") or "\\" in file_name:
+                total_size = 0
+                for info in zip_file.infolist():
+                    if not _ZIP_IMAGE_RE.fullmatch(info.filename):
+                        continue
+                    if info.file_size > ZIP_MAX_ENTRY_SIZE:
                         continue
-                    if file_name.lower().endswith((".jpg", ".jpeg", ".png", ".webp")):
-                        image_files.append(file_name)
+                    if info.compress_size * ZIP_MAX_COMPRESSION_RATIO < info.file_size:
+                        continue
+                    total_size += info.file_size
+                    if total_size > ZIP_MAX_TOTAL_SIZE:
+                        return {"success": False, "error": "ZIP too large: images exceed 1GB uncompressed"}
+                    image_files.append(info.filename)
 
                 if len(image_files) > 50:  # Limit images per ZIP
                     return {"success": False, "error": "Too many images: max 50 per ZIP"}
@@ -529,31 +907,34 @@ def process_zip_file(zip_data):
                 if len(image_files) == 0:
                     return {"success": False, "error": "No valid images found in ZIP"}
 
+                # ZipFile is not thread-safe: entries are read here and fanned
+                # out to IMAGE_EXECUTOR, with at most ZIP_READ_WINDOW decoded
+                # entries held at once; results are collected in archive order
+                in_flight = collections.deque()
+                done = 0
+                
+                def entry_done():
+                    nonlocal done
+                    done += 1
+                    if on_progress:
+                        on_progress(done, len(image_files))
+                
                 for file_name in image_files:
+                    if len(in_flight) >= ZIP_READ_WINDOW:
+                        processed_count += _collect_zip_result(*in_flight.popleft(), results)
+                        entry_done()
                     try:
-                        with zip_file.open(file_name) as image_file:
-                            image_data = image_file.read()
-                            
-                        # Process with full PaletteEngine (includes social image generation)
-                        result = ENGINE.process_image_data(image_data)
-
-                        if result.get("success"):
-                            # Normalize palette format
-                            normalized_palette = []
-                            for c in result.get("raw_palette", []):
-                                if isinstance(c, (list, tuple)) and len(c) == 3:
-                                    normalized_palette.append(list(c))
-
-                            results.append({
-                                "filename": file_name,
-                                "palette": normalized_palette,
-                                "social_image": result.get("social_image")  # Can be None for fallback
-                            })
-                            processed_count += 1
-
+                        image_data = zip_file.read(file_name)
                     except Exception as e:
-                        print(f"Error processing {file_name}: {e}")
+                        logger.error("zip_entry_read_failed", filename=file_name, error=str(e))
+                        entry_done()
                         continue
+                    in_flight.append((file_name, IMAGE_EXECUTOR.submit(ENGINE.process_image_data, image_data)))
+                    del image_data
+
+            while in_flight:
+                processed_count += _collect_zip_result(*in_flight.popleft(), results)
+                entry_done()
 
         except zipfile.BadZipFile:
             return {"success": False, "error": "Invalid ZIP file format"}
@@ -605,7 +986,7 @@ def fetch_url_endpoint():
             return make_error(400, "INVALID_URL", "Invalid or unresolvable URL")
 
         # Fetch the image
-        response = requests.get(
+        response = FETCH_URL_HTTP.get(
             url,
             headers={"User-Agent": "BrewChrome-React/1.0"},
             timeout=40,  # Increased for 408 test
@@ -613,13 +994,17 @@ def fetch_url_endpoint():
         )
         
         if response.status_code >= 500:
+            response.close()  # release the pooled connection
             return make_error(502, "UPSTREAM_ERROR", f"Server error from URL: {response.status_code}")
             
+        if response.status_code >= 400:
+            response.close()
         response.raise_for_status()
 
         # Check content type
         content_type = response.headers.get("content-type", "").lower()
         if not content_type.startswith("image/"):
+            response.close()
             return make_error(415, "UNSUPPORTED_MEDIA", "URL does not point to an image")
 
         # Read and encode image
@@ -627,8 +1012,10 @@ def fetch_url_endpoint():
         if len(image_data) > 50 * 1024 * 1024:  # 50MB limit
             return make_error(413, "PAYLOAD_TOO_LARGE", "Image exceeds 50MB limit")
 
-        image_base64 = base64.b64encode(image_data).decode("utf-8")
+        # pybase64 encodes straight to str (SIMD), skipping the bytes->str decode copy
+        image_base64 = pybase64.b64encode_as_string(image_data)
         
+        g.success = True
         return jsonify({
             "success": True,
             "image": f"data:{content_type};base64,{image_base64}",
@@ -640,6 +1027,8 @@ def fetch_url_endpoint():
         return make_error(408, "URL_TIMEOUT", "Download exceeded 40s")
     except requests.exceptions.RequestException as e:
         return make_error(502, "UPSTREAM_ERROR", f"Network error: {str(e)}")
+    except RequestEntityTooLarge:
+        raise
     except Exception as e:
         return make_error(500, "INTERNAL_ERROR", "Unexpected error occurred")
 
@@ -647,50 +1036,54 @@ def fetch_url_endpoint():
 def process_endpoint():
     """Optimized image processing endpoint for React"""
     try:
+        # Check upload size (50MB limit)
+        if multipart_declared_over(50 * 1024 * 1024):
+            return make_error(413, "PAYLOAD_TOO_LARGE", "File exceeds 50MB limit")
+        
         # Handle multipart/form-data from React frontend
         if 'image' in request.files:
             file = request.files['image']
             if file.filename == '':
                 return make_error(400, "NO_INPUT", "No file selected")
             
-            # Check file size (50MB limit)
-            file.seek(0, 2)  # Seek to end
-            file_size = file.tell()
-            file.seek(0)  # Reset to beginning
-            
-            if file_size > 50 * 1024 * 1024:  # 50MB
-                return make_error(413, "PAYLOAD_TOO_LARGE", "File exceeds 50MB limit")
-            
-            # Convert file to base64
-            file_data = file.read()
-            image_base64 = base64.b64encode(file_data).decode('utf-8')
-            
             # Determine content type
             content_type = file.content_type or 'image/jpeg'
             if not content_type.startswith('image/'):
                 return make_error(415, "UNSUPPORTED_MEDIA", "File must be an image")
                 
-            image_data = f"data:{content_type};base64,{image_base64}"
+            # Raw bytes go straight to the engine, no base64 round-trip; one
+            # byte past the limit is enough to reject bodies sent without
+            # Content-Length, without loading the rest into memory
+            image_bytes = file.read(50 * 1024 * 1024 + 1)
+            if not image_bytes:
+                return make_error(400, "NO_INPUT", "No image data provided")
+            if len(image_bytes) > 50 * 1024 * 1024:
+                return make_error(413, "PAYLOAD_TOO_LARGE", "File exceeds 50MB limit")
+            result = process_image_bytes(image_bytes, content_type)
             
         else:
-            # JSON fallback
-            data = request.get_json()
+            # JSON fallback: parsed once, without caching the raw body on the request
+            data = request.get_json(silent=True, cache=False)
             if not data:
                 return make_error(400, "NO_INPUT", "No input provided")
-            image_data = data.get("image")
+            image_data = data.pop("image", None)
+
+            if not image_data:
+                return make_error(400, "NO_INPUT", "No image data provided")
 
-        if not image_data:
-            return make_error(400, "NO_INPUT", "No image data provided")
+            result = process_image(image_data)
 
-        result = process_image(image_data)
         if not result.get("success"):
             return make_error(422, "PROCESSING_ERROR", result.get("error", "Image processing failed"))
         
         # Count successful image processing
         IMAGES_PROCESSED_TOTAL.labels(endpoint="/process").inc()
         
-        return jsonify(result)
+        g.success = True
+        return json_response(result)
 
+    except RequestEntityTooLarge:
+        raise
     except Exception as e:
         return make_error(500, "INTERNAL_ERROR", "Unexpected error occurred")
 
@@ -698,36 +1091,35 @@ def process_endpoint():
 def process_zip_endpoint():
     """Optimized ZIP processing endpoint for React"""
     try:
+        # Check upload size (500MB limit for ZIP)
+        if multipart_declared_over(500 * 1024 * 1024):
+            return make_error(413, "PAYLOAD_TOO_LARGE", "ZIP exceeds 500MB limit")
+        
         # Handle multipart/form-data from React frontend
         if 'zip_file' in request.files:
             file = request.files['zip_file']
             if file.filename == '':
                 return make_error(400, "NO_INPUT", "No file selected")
             
-            # Check file size (500MB limit for ZIP)
-            file.seek(0, 2)  # Seek to end
-            file_size = file.tell()
-            file.seek(0)  # Reset to beginning
-            
-            if file_size > 500 * 1024 * 1024:  # 500MB
-                return make_error(413, "PAYLOAD_TOO_LARGE", "ZIP exceeds 500MB limit")
+            if not file.stream.read(1):
+                return make_error(400, "NO_INPUT", "No ZIP data provided")
             
-            # Convert file to base64
-            file_data = file.read()
-            zip_base64 = base64.b64encode(file_data).decode('utf-8')
-            zip_data = f"data:application/zip;base64,{zip_base64}"
+            # Werkzeug already spooled the upload to a seekable file: read the
+            # archive from it directly, no copy into memory or base64 round-trip
+            result = process_zip_stream(file.stream)
             
         else:
-            # JSON fallback
-            data = request.get_json()
+            # JSON fallback: parsed once, without caching the raw body on the request
+            data = request.get_json(silent=True, cache=False)
             if not data:
                 return make_error(400, "NO_INPUT", "No input provided")
-            zip_data = data.get("zip")
+            zip_data = data.pop("zip", None)
 
-        if not zip_data:
-            return make_error(400, "NO_INPUT", "No ZIP data provided")
+            if not zip_data:
+                return make_error(400, "NO_INPUT", "No ZIP data provided")
+
+            result = process_zip_file(zip_data)
 
-        result = process_zip_file(zip_data)
         if not result.get("success"):
             error_msg = result.get("error", "ZIP processing failed")
             if "traversal" in error_msg.lower() or "path" in error_msg.lower():
@@ -742,8 +1134,11 @@ def process_zip_endpoint():
         if processed_count > 0:
             IMAGES_PROCESSED_TOTAL.labels(endpoint="/process_zip").inc(processed_count)
                 
-        return jsonify(result)
+        g.success = True
+        return json_response(result)
 
+    except RequestEntityTooLarge:
+        raise
     except Exception as e:
         return make_error(500, "INTERNAL_ERROR", "Unexpected error occurred")
 
@@ -751,58 +1146,71 @@ def process_zip_endpoint():
 def create_job_endpoint():
     """Create async job for batch processing"""
     try:
-        # Get request body for idempotency check
-        body_data = request.get_data()
+        # Request body digest for idempotency check (computed in _before)
+        body_hash = g.body_sha256
         
         # Check for idempotency key
         idempotency_key = request.headers.get('Idempotency-Key')
         if idempotency_key:
-            existing_job_id, conflict = check_idempotency(idempotency_key, body_data)
+            existing_job_id, conflict = check_idempotency(idempotency_key, body_hash)
             if conflict == "IDEMPOTENCY_VIOLATION":
                 return make_error(409, "IDEMPOTENCY_VIOLATION", 
                                 "Same idempotency key with different request body",
                                 f"Key {idempotency_key} already used with different body")
             if existing_job_id:
                 # Return existing job
-                with JOB_LOCK:
-                    job = JOBS.get(existing_job_id, {})
-                return jsonify({
+                job = get_job(existing_job_id) or {}
+                return json_response({
                     "job_id": existing_job_id,
                     "status": job.get("status", "unknown"),
                     "eta_s": 60,
                     "request_id": job.get("request_id", "")
-                }), 202
+                }, 202)
         
         callback_url = None
         ttl_h = 24
         
+        # Check upload size (500MB limit for async jobs)
+        if multipart_declared_over(500 * 1024 * 1024):
+            return make_error(413, "PAYLOAD_TOO_LARGE", "File exceeds 500MB limit")
+        
         # Handle multipart/form-data
         if 'zip_file' in request.files:
             file = request.files['zip_file']
             if file.filename == '':
                 return make_error(400, "NO_INPUT", "No file selected")
             
-            # Check file size (500MB limit for async jobs)
-            file.seek(0, 2)
-            file_size = file.tell()
-            file.seek(0)
-            
-            if file_size > 500 * 1024 * 1024:
-                return make_error(413, "PAYLOAD_TOO_LARGE", "File exceeds 500MB limit")
-            
-            file_data = file.read()
-            zip_base64 = base64.b64encode(file_data).decode('utf-8')
-            zip_data = f"data:application/zip;base64,{zip_base64}"
-            
-            # Get optional parameters from form
+            # Validate the form fields before anything is spooled to disk
             callback_url = request.form.get('callback_url')
-            ttl_h = int(request.form.get('ttl_h', 24))
+            try:
+                ttl_h = int(request.form.get('ttl_h', 24))
+            except ValueError:
+                return make_error(400, "INVALID_INPUT", "ttl_h must be an integer")
+            
+            # Hand the raw archive to the worker, never base64: small uploads
+            # as bytes, larger ones streamed to disk
+            file_size = file.stream.seek(0, io.SEEK_END)
+            file.stream.seek(0)
+            if file_size <= JOB_UPLOAD_INLINE_MAX:
+                zip_job_data = {"zip_bytes": file.read()}
+            else:
+                fd, zip_path = tempfile.mkstemp(suffix=".zip", dir=JOB_UPLOAD_DIR)
+                zip_job_data = {"zip_path": zip_path}
             
-            job_id = create_job("zip_batch", {"zip_data": zip_data}, callback_url, ttl_h, idempotency_key)
+            job_id = None
+            try:
+                if "zip_path" in zip_job_data:
+                    with os.fdopen(fd, "wb") as zip_out:
+                        file.save(zip_out)
+                job_id = create_job("zip_batch", zip_job_data, callback_url, ttl_h, idempotency_key)
+            finally:
+                # The worker never got the spooled file: don't leave it behind
+                if job_id is None and "zip_path" in zip_job_data:
+                    os.remove(zip_job_data["zip_path"])
             
         else:
-            # Handle JSON
-            data = request.get_json()
+            # Handle JSON: parsed once, without caching the raw body on the request
+            data = request.get_json(silent=True, cache=False)
             if not data:
                 return make_error(400, "NO_INPUT", "No input provided")
             
@@ -818,110 +1226,127 @@ def create_job_endpoint():
                 job_id = create_job("url_batch", {"urls": urls}, callback_url, ttl_h, idempotency_key)
                 
             elif 'zip' in data:
-                # ZIP data
-                zip_data = data['zip']
+                # ZIP data: moved out of the parsed body, the job holds the only reference
+                zip_data = data.pop('zip')
                 job_id = create_job("zip_batch", {"zip_data": zip_data}, callback_url, ttl_h, idempotency_key)
                 
             else:
                 return make_error(400, "INVALID_INPUT", "Provide 'urls' array or 'zip' data")
         
+        if job_id is None:
+            return make_error(503, "JOB_QUEUE_FULL", "Too many active jobs, retry later")
+        
         # Store idempotency mapping
         if idempotency_key:
-            store_idempotency(idempotency_key, job_id, body_data)
+            store_idempotency(idempotency_key, job_id, body_hash)
         
         # Estimate ETA based on job type and size
-        with JOB_LOCK:
-            job = JOBS[job_id]
-            if job["type"] == "zip_batch":
-                eta_s = 120  # 2 minutes for ZIP
-            else:
-                eta_s = len(job["data"].get("urls", [])) * 10  # 10s per URL
+        job = get_job(job_id)
+        if job["type"] == "zip_batch":
+            eta_s = 120  # 2 minutes for ZIP
+        else:
+            eta_s = len(job["data"].get("urls", [])) * 10  # 10s per URL
         
-        return jsonify({
+        return json_response({
             "job_id": job_id,
             "status": "queued",
             "eta_s": min(eta_s, 900),  # Max 15 minutes
-            "request_id": getattr(g, "request_id", "")
-        }), 202
+            "request_id": g.request_id
+        }, 202)
         
+    except RequestEntityTooLarge:
+        raise
     except Exception as e:
         return make_error(500, "INTERNAL_ERROR", "Job creation failed", str(e))
 
+def _job_response(job: dict, progress: int = 0) -> dict:
+    """Public view of a job as returned by GET /jobs/<id>"""
+    response = {
+        "job_id": job["id"],
+        "status": job["status"],
+        "request_id": job["request_id"],
+        "created_at": int(job["created_at"]),
+        "expires_at": int(job["created_at"] + job["ttl_h"] * 3600)
+    }
+    
+    if job.get("started_at"):
+        response["started_at"] = int(job["started_at"])
+    if job.get("finished_at"):
+        response["finished_at"] = int(job["finished_at"])
+    
+    if job["status"] == "processing":
+        response["progress"] = progress
+        
+    elif job["status"] == "completed":
+        response["results"] = job["results"]
+        response["results_count"] = job["results_count"]
+        if job.get("download_url"):
+            response["download_url"] = job["download_url"]
+            response["download_expires_at"] = job["download_expires_at"]
+        
+    elif job["status"] == "failed":
+        response.update(job["error"])
+        response["user_message"] = f"Job failed: {job['error'].get('message', 'Unknown error')}"
+    
+    return response
+
+def _render_job(job: dict) -> tuple:
+    """Serialize a job view once: (JSON body bytes, quoted ETag)"""
+    # _job_response builds keys in a fixed order, so the body bytes themselves
+    # are a stable ETag input; no separate sort_keys serialization to hash
+    body = orjson.dumps(_job_response(job))
+    return body, f'"{hashlib.blake2b(body, digest_size=4).hexdigest()}"'
+
+def _progress_etag(job_id: str, progress: int) -> str:
+    """Quoted ETag of a processing job: only its progress changes between transitions"""
+    return f'"{hashlib.blake2b(f"{job_id}:{progress}".encode(), digest_size=4).hexdigest()}"'
+
 @app.route("/jobs/<job_id>", methods=["GET"])
 def get_job_status(job_id: str):
     """Get job status and results"""
     try:
-        with JOB_LOCK:
-            job = JOBS.get(job_id)
+        job = get_job(job_id)
             
         if not job:
             return make_error(404, "JOB_NOT_FOUND", "Job not found")
         
-        # Check TTL and mark as expired
-        current_time = time.time()
-        expires_at = job["created_at"] + job["ttl_h"] * 3600
-        
-        if current_time > expires_at:
-            # Mark as expired and clean up
-            with JOB_LOCK:
-                if job_id in JOBS:
-                    JOBS[job_id]["status"] = "expired"
-                    JOBS[job_id]["results"] = None  # Clear results
-                    JOBS[job_id]["download_url"] = None
+        # Check TTL
+        if time.monotonic() - job["created_monotonic"] > job["ttl_h"] * 3600:
+            # Read-only: the expiry sweeper removes it
             return make_error(404, "EXPIRED_JOB", "Job results have expired")
         
-        response = {
-            "job_id": job_id,
-            "status": job["status"],
-            "request_id": job["request_id"],
-            "created_at": int(job["created_at"]),
-            "expires_at": int(expires_at)
-        }
+        if job["status"] == "failed":
+            g.error_code = job["error"].get("error_code")
+        
+        # Body and ETag are rendered once per state transition; a processing
+        # job's ETag is keyed on its progress so 304s never build a body
+        if job["status"] == "processing":
+            progress = JOB_PROGRESS.get(job_id, 0)
+            etag = _progress_etag(job_id, progress)
+        else:
+            etag = job["_etag"]
+        
+        # Retry-After hint based on status
+        retry_after = JOB_RETRY_AFTER.get(job["status"])
         
-        if job.get("started_at"):
-            response["started_at"] = int(job["started_at"])
-        if job.get("finished_at"):
-            response["finished_at"] = int(job["finished_at"])
+        # Check If-None-Match for 304 before materializing the body; a bare
+        # (body, status, headers) tuple skips building a response by hand
+        if request.headers.get('If-None-Match') == etag:
+            if retry_after:
+                return b"", 304, (("ETag", etag), ("Retry-After", retry_after))
+            return b"", 304, (("ETag", etag),)
         
         if job["status"] == "processing":
-            response["progress"] = job["progress"]
-            
-        elif job["status"] == "completed":
-            response["results"] = job["results"]
-            response["results_count"] = len(job["results"])
-            if job.get("download_url"):
-                response["download_url"] = job["download_url"]
-                response["download_expires_at"] = int(current_time + 3600)  # 1 hour
-            
-        elif job["status"] == "failed":
-            response.update(job["error"])
-            response["user_message"] = f"Job failed: {job['error'].get('message', 'Unknown error')}"
-        
-        # Create ETag from complete response
-        response_json = json.dumps(response, sort_keys=True)
-        etag = hashlib.md5(response_json.encode()).hexdigest()[:8]
-        
-        # Check If-None-Match for 304
-        if request.headers.get('If-None-Match') == f'"{etag}"':
-            resp = make_response('', 304)
-            resp.headers['ETag'] = f'"{etag}"'
-            # Still provide Retry-After hint
-            if job["status"] == "queued":
-                resp.headers['Retry-After'] = '2'
-            elif job["status"] == "processing":
-                resp.headers['Retry-After'] = '5'
-            return resp
+            body = orjson.dumps(_job_response(job, progress))
+        else:
+            body = job["_cached_json"]
         
         # Create response with headers
-        resp = jsonify(response)
-        resp.headers['ETag'] = f'"{etag}"'
+        resp = app.response_class(body, mimetype="application/json")
+        resp.headers['ETag'] = etag
         resp.headers['Cache-Control'] = 'no-store'
-        
-        # Retry-After hint based on status
-        if job["status"] == "queued":
-            resp.headers['Retry-After'] = '2'
-        elif job["status"] == "processing":
-            resp.headers['Retry-After'] = '5'
+        if retry_after:
+            resp.headers['Retry-After'] = retry_after
             
         return resp
         
@@ -931,57 +1356,128 @@ def get_job_status(job_id: str):
 @app.route("/metrics", methods=["GET"])
 def metrics():
     """Prometheus metrics endpoint"""
-    data = generate_latest()
+    now = time.monotonic()
+    cached = _METRICS_CACHE["entry"]
+    if cached and now < cached[0]:
+        data = cached[1]
+    else:
+        data = generate_latest()
+        _METRICS_CACHE["entry"] = (now + METRICS_CACHE_TTL, data)
     return data, 200, {"Content-Type": CONTENT_TYPE_LATEST}
 
+def _probe_response(body: bytes, status_code: int = 200):
+    """Build a non-cacheable JSON response for health/readiness probes"""
+    resp = app.response_class(body, status=status_code, mimetype="application/json")
+    resp.headers["Cache-Control"] = "no-store"
+    return resp
+
 @app.route("/health", methods=["GET"])
 def health_check():
     """Health check endpoint"""
-    return jsonify({
+    return _probe_response(orjson.dumps({
         "status": "healthy",
         "service": "brewchrome-react-backend",
         "version": "1.0.0",
         "features": ["colorthief", "zip_processing", "react_optimized"],
-        "uptime_seconds": int(time.time() - START_TIME)
-    })
+        "uptime_seconds": int(time.monotonic() - START_TIME)
+    }))
 
-@app.route("/ready", methods=["GET"])
-def ready():
-    """Readiness check endpoint - verifies service is ready for traffic"""
-    deps = {}
+def _has_module(name: str) -> bool:
+    """Check once at startup whether an optional library is importable"""
+    try:
+        importlib.import_module(name)
+        return True
+    except ImportError:
+        return False
+
+_HAS_COLORTHIEF = _has_module("colorthief")
+_HAS_SMARTCROP = _has_module("smartcrop")
 
-    # Controllo disco temporaneo
+def _memo_ok(check):
+    """Trust a passing dependency check for DEP_CHECK_TTL seconds; failures are re-checked"""
+    ok_until = [0.0]
+    
+    @functools.wraps(check)
+    def wrapper() -> bool:
+        now = time.monotonic()
+        if now < ok_until[0]:
+            return True
+        ok = check()
+        if ok:
+            ok_until[0] = now + DEP_CHECK_TTL
+        return ok
+    return wrapper
+
+@_memo_ok
+def _check_disk() -> bool:
+    """Check free space on the temp disk (>1GB)"""
     try:
-        disk_ok = shutil.disk_usage("/tmp").free > 1 * 1024 * 1024 * 1024  # >1GB
-        deps["disk"] = disk_ok
+        st = os.statvfs("/tmp")
+        return st.f_bavail * st.f_frsize > 1 * 1024 * 1024 * 1024
     except Exception:
-        deps["disk"] = False
+        return False
 
-    # Controllo memoria disponibile
+def _mem_available() -> int:
+    """Available memory in bytes, read straight from /proc/meminfo on Linux"""
     try:
-        mem_ok = psutil.virtual_memory().available > 100 * 1024 * 1024  # >100MB
-        deps["mem"] = mem_ok
+        with open("/proc/meminfo", "rb") as meminfo:
+            for line in meminfo:
+                if line.startswith(b"MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return psutil.virtual_memory().available
+
+@_memo_ok
+def _check_mem() -> bool:
+    """Check available memory (>100MB)"""
+    try:
+        return _mem_available() > 100 * 1024 * 1024
     except Exception:
-        deps["mem"] = False
+        return False
 
-    # Controllo librerie Python
-    for lib in ["colorthief", "smartcrop"]:
-        try:
-            importlib.import_module(lib)
-            deps[lib] = True
-        except ImportError:
-            deps[lib] = False
+def _error_rate_last_5m(now: float) -> float:
+    """Share of non-probe requests answered with 5xx in the last 5 minutes"""
+    cutoff = int(now) - ERROR_RATE_WINDOW
+    requests_seen = errors = 0
+    with _RATE_LOCK:
+        for second, count, error_count in _RATE_BUCKETS:
+            if second > cutoff:
+                requests_seen += count
+                errors += error_count
+    return round(errors / max(1, requests_seen), 4)
 
-    ready = all(deps.values())
-    status_code = 200 if ready else 503
+@app.route("/ready", methods=["GET"])
+def ready():
+    """Readiness check endpoint - verifies service is ready for traffic"""
+    now = time.monotonic()
+    cached = _READY_CACHE["entry"]
+    if cached and now < cached[0]:
+        return _probe_response(cached[1], cached[2])
+
+    deps = {
+        "disk": _check_disk(),
+        "mem": _check_mem(),
+        "colorthief": _HAS_COLORTHIEF,
+        "smartcrop": _HAS_SMARTCROP,
+    }
 
-    return jsonify({
-        "ready": ready, 
+    # Disk first: it is the check that usually fails
+    is_ready = deps["disk"] and deps["mem"] and deps["colorthief"] and deps["smartcrop"]
+    status_code = 200 if is_ready else 503
+
+    payload = {
+        "ready": is_ready, 
         "dependencies": deps,
-        "uptime_seconds": int(time.time() - START_TIME),
+        "uptime_seconds": int(time.monotonic() - START_TIME),
         "active_requests": 0,
-        "error_rate_last_5m": None
-    }), status_code
+        "error_rate_last_5m": _error_rate_last_5m(now)
+    }
+    body = orjson.dumps(payload)
+    ttl = READY_CACHE_TTL_OK if is_ready else READY_CACHE_TTL_FAIL
+    _READY_CACHE["entry"] = (now + ttl, body, status_code)
+
+    return _probe_response(body, status_code)
 
 if __name__ == "__main__":
     app.run(debug=True, host="0.0.0.0", port=int(os.environ.get("PORT", 8080)))
@@ -1,8 +1,22 @@
 #!/usr/bin/env python3
 """Simple test script for backend functionality"""
 
+import base64
+import collections
+import hashlib
+import hmac
+import io
 import json
-from main import process_image, process_zip_file
+import random
+import threading
+import time
+import zipfile
+
+from cachetools import TLRUCache
+from PIL import Image
+
+import main
+from main import process_image, process_image_bytes, process_zip_bytes, process_zip_file
 
 def test_process_image():
     """Test single image processing"""
@@ -14,6 +28,304 @@ def test_process_image():
     print(json.dumps(result, indent=2))
     return result.get("success", False)
 
+def test_process_image_bytes():
+    """Test raw image bytes processing (multipart path, no base64)"""
+    raw = base64.b64decode("iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mP8/5+hHgAHggJ/PchI7wAAAABJRU5ErkJggg==")
+    
+    result = process_image_bytes(raw, "image/png")
+    assert result.get("success"), result
+    assert len(result["palette"]) == 10
+
+def _png_bytes(color=(200, 30, 30)):
+    buf = io.BytesIO()
+    Image.new("RGB", (16, 16), color).save(buf, "PNG")
+    return buf.getvalue()
+
+def _zip_bytes(entries):
+    """Build an in-memory ZIP from {name: bytes}, deflated"""
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zip_file:
+        for name, data in entries.items():
+            zip_file.writestr(name, data)
+    return buf.getvalue()
+
+def test_process_zip_file_base64_forms(monkeypatch):
+    """Data URIs, bare and line-wrapped base64 all decode, across several slices"""
+    monkeypatch.setattr(main, "BASE64_DECODE_CHUNK", 64)
+    zip_bytes = _zip_bytes({"a.png": _png_bytes(), "b.png": _png_bytes((0, 0, 255))})
+    encoded = base64.b64encode(zip_bytes).decode()
+    payloads = [
+        f"data:application/zip;base64,{encoded}",
+        encoded,
+        base64.encodebytes(zip_bytes).decode(),
+    ]
+    for payload in payloads:
+        result = process_zip_file(payload)
+        assert result["success"], result
+        assert [r["filename"] for r in result["results"]] == ["a.png", "b.png"]
+    
+    assert "Base64 decode error" in process_zip_file("not base64!")["error"]
+
+def test_zip_image_name_filter():
+    """Traversal, absolute and backslash paths are never picked up"""
+    assert main._ZIP_IMAGE_RE.fullmatch("dir/a.png")
+    assert main._ZIP_IMAGE_RE.fullmatch("photo.JPEG")
+    assert not main._ZIP_IMAGE_RE.fullmatch("../a.png")
+    assert not main._ZIP_IMAGE_RE.fullmatch("dir/../../a.png")
+    assert not main._ZIP_IMAGE_RE.fullmatch("/abs.png")
+    assert not main._ZIP_IMAGE_RE.fullmatch("a\\b.png")
+    assert not main._ZIP_IMAGE_RE.fullmatch("notes.txt")
+
+def test_zip_skips_oversized_entry(monkeypatch):
+    """Entries over ZIP_MAX_ENTRY_SIZE are skipped, the rest still processed"""
+    big = _png_bytes() + b"\0" * 4096
+    monkeypatch.setattr(main, "ZIP_MAX_ENTRY_SIZE", len(big) - 1)
+    result = process_zip_bytes(_zip_bytes({"ok.png": _png_bytes(), "big.png": big}))
+    assert result["success"], result
+    assert [r["filename"] for r in result["results"]] == ["ok.png"]
+
+def test_zip_skips_high_compression_ratio():
+    """An entry compressing better than 100:1 is treated as a bomb and skipped"""
+    bomb = b"\0" * (1024 * 1024)
+    result = process_zip_bytes(_zip_bytes({"ok.png": _png_bytes(), "bomb.png": bomb}))
+    assert result["success"], result
+    assert [r["filename"] for r in result["results"]] == ["ok.png"]
+
+def test_zip_total_size_limit(monkeypatch):
+    """Too much uncompressed image data fails the ZIP and maps to 413"""
+    monkeypatch.setattr(main, "ZIP_MAX_TOTAL_SIZE", 100)
+    zip_bytes = _zip_bytes({"a.png": _png_bytes(), "b.png": _png_bytes((0, 0, 255))})
+    result = process_zip_bytes(zip_bytes)
+    assert not result["success"]
+    assert "too large" in result["error"].lower()
+    
+    client = main.app.test_client()
+    resp = client.post("/process_zip", data={"zip_file": (io.BytesIO(zip_bytes), "images.zip")})
+    assert resp.status_code == 413
+    assert resp.get_json()["error_code"] == "PAYLOAD_TOO_LARGE"
+
+def _signed_headers(body: bytes, request_id: str) -> dict:
+    """Headers for a POST /jobs signed the way clients sign it"""
+    timestamp = str(int(time.time()))
+    message = f"{timestamp}\nPOST\n/jobs\n{hashlib.sha256(body).hexdigest()}"
+    signature = hmac.new(main._HMAC_KEY, message.encode(), hashlib.sha256).hexdigest()
+    return {
+        "Content-Type": "application/json",
+        "X-Timestamp": timestamp,
+        "X-Signature": f"sha256={signature}",
+        "X-Request-Id": request_id,
+    }
+
+def test_signature_covers_streamed_body(monkeypatch):
+    """The signature is checked against the digest of the streamed body"""
+    monkeypatch.setenv("REQUIRE_SIGNATURE", "true")
+    monkeypatch.setattr(main.EXECUTOR, "submit", lambda *args, **kwargs: None)
+    body = json.dumps({"urls": ["https://example.com/a.png"]}).encode()
+    client = main.app.test_client()
+    
+    signed = client.post("/jobs", data=body, headers=_signed_headers(body, f"sig-{time.monotonic_ns()}"))
+    assert signed.status_code == 202
+    
+    tampered = body.replace(b"a.png", b"b.png")
+    resp = client.post("/jobs", data=tampered, headers=_signed_headers(body, f"sig-{time.monotonic_ns()}"))
+    assert resp.status_code == 401
+    assert resp.get_json()["error_code"] == "INVALID_SIGNATURE"
+
+def test_claim_nonce(monkeypatch):
+    """A nonce is accepted once; a full store rejects rather than evicting"""
+    monkeypatch.setattr(main, "NONCE_CACHE", TLRUCache(maxsize=2, ttu=lambda _n, _ts, now: now + 300))
+    now = int(time.time())
+    assert main.claim_nonce("nonce-1", now) is None
+    assert main.claim_nonce("nonce-1", now) == "NONCE_REUSED"
+    assert main.claim_nonce("nonce-2", now) is None
+    assert main.claim_nonce("nonce-3", now) == "NONCE_STORE_FULL"
+    assert main.claim_nonce("nonce-1", now) == "NONCE_REUSED"
+
+def test_signed_request_replay_rejected(monkeypatch):
+    """A correctly signed request can't be replayed with the same X-Request-Id"""
+    monkeypatch.setenv("REQUIRE_SIGNATURE", "true")
+    monkeypatch.setattr(main.EXECUTOR, "submit", lambda *args, **kwargs: None)
+    body = json.dumps({"urls": ["https://example.com/a.png"]}).encode()
+    headers = _signed_headers(body, f"replay-{time.monotonic_ns()}")
+    
+    client = main.app.test_client()
+    assert client.post("/jobs", data=body, headers=headers).status_code == 202
+    replay = client.post("/jobs", data=body, headers=headers)
+    assert replay.status_code == 401
+    assert replay.get_json()["error_code"] == "NONCE_REUSED"
+
+def test_unsigned_request_claims_no_nonce(monkeypatch):
+    """A request failing the signature check doesn't use up its nonce"""
+    monkeypatch.setenv("REQUIRE_SIGNATURE", "true")
+    monkeypatch.setattr(main.EXECUTOR, "submit", lambda *args, **kwargs: None)
+    body = json.dumps({"urls": ["https://example.com/a.png"]}).encode()
+    headers = _signed_headers(body, f"forged-{time.monotonic_ns()}")
+    
+    client = main.app.test_client()
+    forged = client.post("/jobs", data=body, headers={**headers, "X-Signature": "sha256=" + "0" * 64})
+    assert forged.get_json()["error_code"] == "INVALID_SIGNATURE"
+    assert client.post("/jobs", data=body, headers=headers).status_code == 202
+
+def test_idempotency_fingerprint():
+    """Same key and body returns the job; same key with another body conflicts"""
+    body_hash = hashlib.sha256(b"body-1").hexdigest()
+    other_hash = hashlib.sha256(b"body-2").hexdigest()
+    main.store_idempotency("test-idem-key", "job_abc", body_hash)
+    assert main.check_idempotency("test-idem-key", body_hash) == ("job_abc", None)
+    assert main.check_idempotency("test-idem-key", other_hash) == (None, "IDEMPOTENCY_VIOLATION")
+    assert main.check_idempotency("unknown-key", body_hash) == (None, None)
+
+def test_idempotency_conflict_returns_409(monkeypatch):
+    """POST /jobs reusing a key with a different body is rejected"""
+    monkeypatch.setattr(main.EXECUTOR, "submit", lambda *args, **kwargs: None)
+    client = main.app.test_client()
+    headers = {"Idempotency-Key": "test-idem-409"}
+    
+    first = client.post("/jobs", json={"urls": ["https://example.com/a.png"]}, headers=headers)
+    assert first.status_code == 202
+    replay = client.post("/jobs", json={"urls": ["https://example.com/a.png"]}, headers=headers)
+    assert replay.status_code == 202
+    assert replay.get_json()["job_id"] == first.get_json()["job_id"]
+    conflict = client.post("/jobs", json={"urls": ["https://example.com/b.png"]}, headers=headers)
+    assert conflict.status_code == 409
+    assert conflict.get_json()["error_code"] == "IDEMPOTENCY_VIOLATION"
+
+def _stub_job(monkeypatch, data=None, **kwargs):
+    """Create a job without running it"""
+    monkeypatch.setattr(main.EXECUTOR, "submit", lambda *args, **kwargs: None)
+    with main.app.test_request_context():
+        main.g.request_id = "test"
+        return main.create_job("url_batch", data or {"urls": []}, **kwargs)
+
+def _single_stripe_table(monkeypatch, capacity):
+    """Swap in an empty job table with one stripe of the given capacity"""
+    monkeypatch.setattr(main, "JOB_SHARD_COUNT", 1)
+    monkeypatch.setattr(main, "JOB_SHARD_CAPACITY", capacity)
+    monkeypatch.setattr(main, "JOB_SHARDS", [(collections.OrderedDict(), threading.Lock(), [])])
+    return main.JOB_SHARDS[0][0]
+
+def test_full_stripe_of_active_jobs_returns_503(monkeypatch, tmp_path):
+    """Active jobs are never evicted; the spooled upload of the refused job is removed"""
+    _single_stripe_table(monkeypatch, 1)
+    monkeypatch.setattr(main, "JOB_UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(main, "JOB_UPLOAD_INLINE_MAX", 0)
+    active_id = _stub_job(monkeypatch)
+    
+    client = main.app.test_client()
+    zip_bytes = _zip_bytes({"a.png": _png_bytes()})
+    resp = client.post("/jobs", data={"zip_file": (io.BytesIO(zip_bytes), "images.zip")})
+    assert resp.status_code == 503
+    assert resp.get_json()["error_code"] == "JOB_QUEUE_FULL"
+    assert main.get_job(active_id) is not None
+    assert list(tmp_path.iterdir()) == []
+
+def test_finished_job_evicted_for_new_one(monkeypatch):
+    """A full stripe makes room by dropping its least recently updated finished job"""
+    jobs = _single_stripe_table(monkeypatch, 2)
+    finished_id = _stub_job(monkeypatch)
+    active_id = _stub_job(monkeypatch)
+    main._update_job(finished_id, status="completed", results=[], results_count=0, finished_at=time.time())
+    
+    new_id = _stub_job(monkeypatch)
+    assert new_id is not None
+    assert list(jobs) == [active_id, new_id]
+    assert finished_id not in main.JOB_PROGRESS
+
+def test_expired_jobs_swept_from_heap(monkeypatch):
+    """Jobs past their TTL are dropped via the expiry heap, active or not"""
+    jobs = _single_stripe_table(monkeypatch, 1)
+    expired_id = _stub_job(monkeypatch, ttl_h=0)
+    
+    # The stripe is full of an active job, but it has expired: creating sweeps it
+    new_id = _stub_job(monkeypatch)
+    assert new_id is not None
+    assert list(jobs) == [new_id]
+    assert expired_id not in main.JOB_PROGRESS
+    
+    expiry = main.JOB_SHARDS[0][2]
+    main._sweep_expired(jobs, expiry, time.monotonic() + 24 * 3600 + 1)
+    assert not jobs and not expiry
+    assert new_id not in main.JOB_PROGRESS
+
+def test_completed_job_not_modified(monkeypatch):
+    """A completed job answers If-None-Match with an empty 304"""
+    job_id = _stub_job(monkeypatch)
+    main._update_job(job_id, status="completed", results=[], results_count=0, finished_at=time.time())
+    client = main.app.test_client()
+    
+    first = client.get(f"/jobs/{job_id}")
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    
+    cached = client.get(f"/jobs/{job_id}", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.data == b""
+    assert cached.headers["ETag"] == etag
+    assert "Retry-After" not in cached.headers
+
+def test_processing_job_etag_follows_progress(monkeypatch):
+    """A processing job's ETag changes as its progress moves"""
+    job_id = _stub_job(monkeypatch)
+    main._update_job(job_id, status="processing", started_at=time.time())
+    client = main.app.test_client()
+    
+    main.JOB_PROGRESS[job_id] = 10
+    first = client.get(f"/jobs/{job_id}")
+    assert first.get_json()["progress"] == 10
+    etag = first.headers["ETag"]
+    
+    cached = client.get(f"/jobs/{job_id}", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.headers["ETag"] == etag
+    assert cached.headers["Retry-After"] == "5"
+    
+    main.JOB_PROGRESS[job_id] = 60
+    moved = client.get(f"/jobs/{job_id}", headers={"If-None-Match": etag})
+    assert moved.status_code == 200
+    assert moved.get_json()["progress"] == 60
+    assert moved.headers["ETag"] != etag
+
+def test_url_batch_window(monkeypatch):
+    """URL jobs keep request order, skip failed URLs and bound in-flight URLs"""
+    urls = [f"https://example.com/img{i}.png" for i in range(30)]
+    lock = threading.Lock()
+    in_flight = 0
+    peak = 0
+    
+    def release():
+        nonlocal in_flight
+        with lock:
+            in_flight -= 1
+    
+    def fake_fetch(url):
+        nonlocal in_flight, peak
+        with lock:
+            in_flight += 1
+            peak = max(peak, in_flight)
+        time.sleep(random.uniform(0, 0.01))
+        index = int(url.rsplit("img", 1)[1].split(".")[0])
+        if index % 5 == 0:
+            release()
+            return {"success": False, "error": "404"}
+        return {"success": True, "image_bytes": url.encode(), "content_type": "image/png"}
+    
+    def fake_process(image_bytes, content_type):
+        time.sleep(random.uniform(0, 0.01))
+        release()
+        return {"success": True, "palette": [image_bytes.decode()], "social_image": None}
+    
+    monkeypatch.setattr(main, "fetch_url_internal", fake_fetch)
+    monkeypatch.setattr(main, "process_image_bytes", fake_process)
+    job_id = _stub_job(monkeypatch, {"urls": urls})
+    main.process_job(job_id)
+    
+    job = main.get_job(job_id)
+    assert job["status"] == "completed"
+    results = json.loads(job["_cached_json"])["results"]
+    assert [r["palette"][0] for r in results] == [url for i, url in enumerate(urls) if i % 5]
+    assert 0 < peak <= main.URL_BATCH_WINDOW
+    assert main.JOB_PROGRESS[job_id] == 100
+
 if __name__ == "__main__":
     print("Testing backend functionality...")
     